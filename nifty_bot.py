@@ -1,8 +1,16 @@
 import asyncio
 import os
+import random
+import struct
+import sys
 from telegram import Bot
-import requests
-from datetime import datetime
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+import aiohttp
+import httpx
+import orjson
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
 import logging
 
 # Logging setup
@@ -20,21 +28,258 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 DHAN_CLIENT_ID = os.getenv("DHAN_CLIENT_ID")
 DHAN_ACCESS_TOKEN = os.getenv("DHAN_ACCESS_TOKEN")
 
+REQUIRED_ENV = ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "DHAN_CLIENT_ID", "DHAN_ACCESS_TOKEN")
+
 # Dhan API URLs
 DHAN_API_BASE = "https://api.dhan.co"
-DHAN_LTP_URL = f"{DHAN_API_BASE}/v2/marketfeed/ltp"
-DHAN_OHLC_URL = f"{DHAN_API_BASE}/v2/marketfeed/ohlc"
+# (paths - HTTP client DHAN_API_BASE ला base_url म्हणून वापरतो)
+DHAN_LTP_PATH = "/v2/marketfeed/ltp"
+DHAN_OHLC_PATH = "/v2/marketfeed/ohlc"
+
+# Dhan Live Market Feed (WebSocket v2)
+DHAN_FEED_URL = "wss://api-feed.dhan.co"
+FEED_REQUEST_QUOTE = 17
+FEED_SUBSCRIBE_BATCH = 100
+FEED_RECONNECT_MAX = 60
+
+# Feed binary packets मधले exchange segment codes
+FEED_SEGMENTS = {
+    "IDX_I": 0,
+    "NSE_EQ": 1,
+    "NSE_FNO": 2,
+    "NSE_CURRENCY": 3,
+    "BSE_EQ": 4,
+    "MCX_COMM": 5,
+    "BSE_CURRENCY": 7,
+    "BSE_FNO": 8,
+}
+FEED_SEGMENT_NAMES = {code: seg for seg, code in FEED_SEGMENTS.items()}
+
+# Feed response codes
+FEED_TICKER = 2
+FEED_QUOTE = 4
+FEED_PREV_CLOSE = 6
+FEED_DISCONNECT = 50
+
+# Packet layouts (little-endian)
+FEED_HEADER = struct.Struct('<BHBI')
+FEED_TICKER_BODY = struct.Struct('<fi')
+FEED_QUOTE_BODY = struct.Struct('<fhifiiiffff')
+FEED_PREV_CLOSE_BODY = struct.Struct('<fi')
+FEED_DISCONNECT_BODY = struct.Struct('<h')
+FEED_BODIES = {
+    FEED_TICKER: FEED_TICKER_BODY,
+    FEED_QUOTE: FEED_QUOTE_BODY,
+    FEED_PREV_CLOSE: FEED_PREV_CLOSE_BODY,
+    FEED_DISCONNECT: FEED_DISCONNECT_BODY,
+}
+
+# Watchlist - exchange segment -> {security_id: display name}
+# सगळे symbols एकाच OHLC request मध्ये जातात
+WATCHLIST = {
+    "IDX_I": {
+        13: "NIFTY 50",
+        25: "BANK NIFTY",
+        27: "FIN NIFTY",
+    },
+}
+
+WATCHLIST_SIZE = sum(len(ids) for ids in WATCHLIST.values())
+
+# इतके symbols झाले की JSON parse / message formatting worker thread मध्ये
+OFFLOAD_MIN_SYMBOLS = 50
+
+# Telegram message length limit (UTF-16 code units)
+TELEGRAM_MAX_LENGTH = 4096
+
+# Update interval (seconds)
+UPDATE_INTERVAL_ENV = os.getenv("UPDATE_INTERVAL", "60")
+try:
+    UPDATE_INTERVAL = int(UPDATE_INTERVAL_ENV)
+except ValueError:
+    # Invalid value - __main__ मधल्या check मध्ये reject होतो
+    UPDATE_INTERVAL = 0
+
+# Quote source: "feed" (WebSocket, REST fallback) किंवा "rest" (फक्त polling)
+DHAN_PROVIDER = os.getenv("DHAN_PROVIDER", "feed")
+PROVIDERS = ("feed", "rest")
+PROVIDER_LABELS = {"feed": "WebSocket feed", "rest": "REST"}
+
+# Messages मध्ये दाखवायचा interval
+if UPDATE_INTERVAL == 60:
+    INTERVAL_LABEL_EN = "every minute"
+    INTERVAL_LABEL_MR = "दर मिनिटाला"
+else:
+    INTERVAL_LABEL_EN = f"every {UPDATE_INTERVAL}s"
+    INTERVAL_LABEL_MR = f"दर {UPDATE_INTERVAL} seconds ला"
+
+# Startup message साठी जास्तीत जास्त वेळ (seconds)
+STARTUP_MSG_TIMEOUT = 5
 
-# Nifty 50 Index Security ID
-NIFTY_50_SECURITY_ID = 13
+# Quotes बदलले नसतील तरी दर N minutes ला message (heartbeat)
+HEARTBEAT_MINUTES = 5
+
+# Retry (Dhan + Telegram transient errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE = 1
+RETRY_CAP = 30
+
+# Market Hours (IST, Mon-Fri)
+IST = ZoneInfo("Asia/Kolkata")
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+
+# ========================
+# MARKET HOURS HELPERS
+# ========================
+
+def is_market_open(now):
+    """Market चालू आहे का ते तपासतो (9:15 - 15:30 IST, Mon-Fri)"""
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_market_open(now):
+    """पुढचा market open चा datetime (IST) देतो"""
+    day = now.date()
+    if now.time() >= MARKET_OPEN:
+        day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return datetime.combine(day, MARKET_OPEN, tzinfo=IST)
+
+
+def seconds_until_next_open(now):
+    """Market open होईपर्यंत किती seconds बाकी आहेत (चालू असेल तर 0)"""
+    if is_market_open(now):
+        return 0
+    return (next_market_open(now) - now).total_seconds()
+
+
+def _retry_delay(attempt, retry_after=None):
+    """Server ने सांगितलेला Retry-After, नाहीतर exponential backoff + jitter"""
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_CAP, RETRY_BASE * 2 ** attempt) + random.uniform(0, 0.5)
+
+
+async def with_retry(fn, *, max_attempts=RETRY_MAX_ATTEMPTS, idempotent=True):
+    """Transient errors (429/5xx, timeout, connection reset) वर fn() परत चालवतो
+    
+    idempotent=False (उदा. send_message) असेल तर TimedOut retry होत नाही -
+    timeout झालेला message कदाचित आधीच पोहोचलेला असतो, retry केल्यास duplicate.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await fn()
+        except RetryAfter as e:
+            delay = _retry_delay(attempt, e.retry_after)
+            error = e
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in RETRY_STATUSES:
+                raise
+            delay = _retry_delay(attempt, e.response.headers.get('Retry-After'))
+            error = e
+        except BadRequest:
+            raise
+        except TimedOut as e:
+            if not idempotent:
+                raise
+            delay = _retry_delay(attempt)
+            error = e
+        except (httpx.TransportError, NetworkError) as e:
+            delay = _retry_delay(attempt)
+            error = e
+        
+        if attempt == max_attempts - 1:
+            raise error
+        if delay > RETRY_CAP:
+            # Server ची window cap पेक्षा मोठी - लवकर retry केल्यास परत 429 येईल
+            logger.warning(f"Retry-After {delay:.0f}s exceeds cap ({RETRY_CAP}s) - giving up")
+            raise error
+        logger.warning(f"Transient error ({error!r}) - retry {attempt + 1}/{max_attempts - 1} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+@dataclass(slots=True)
+class Quote:
+    """एका symbol चा LTP + OHLC snapshot"""
+    name: str
+    ltp: float
+    open: float
+    high: float
+    low: float
+    close: float
+    change: float = 0.0
+    change_pct: float = 0.0
+
+
+def build_quote(name, ltp, open_, high, low, close):
+    """LTP + OHLC वरून Quote बनवतो - change फक्त prev close असेल तरच"""
+    quote = Quote(name, ltp, open_, high, low, close)
+    if close > 0:
+        quote.change = ltp - close
+        quote.change_pct = quote.change / close * 100
+    return quote
+
+
+def telegram_length(text):
+    """Telegram length limit UTF-16 units मध्ये मोजतो (emoji = 2)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def parse_ohlc_response(body):
+    """Dhan OHLC response (raw bytes) मधून Quote list बनवतो"""
+    data = orjson.loads(body)
+    if data.get('status') != 'success' or 'data' not in data:
+        return []
+    
+    quotes = []
+    for seg, idmap in data['data'].items():
+        names = WATCHLIST.get(seg, {})
+        for sid, quote in idmap.items():
+            if not quote or 'last_price' not in quote:
+                continue
+            
+            ohlc = quote.get('ohlc', {})
+            quotes.append(build_quote(
+                names.get(int(sid), f"{seg}:{sid}"),
+                quote['last_price'],
+                ohlc.get('open', 0),
+                ohlc.get('high', 0),
+                ohlc.get('low', 0),
+                ohlc.get('close', 0)
+            ))
+    return quotes
 
 # ========================
 # BOT CODE
 # ========================
 
 class NiftyLTPBot:
-    def __init__(self):
-        self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    # Static messages - class load ला एकदाच तयार होतात
+    _STARTUP_MSG_TEMPLATE = (
+        "🤖 *Nifty 50 LTP Bot Started!*\n\n"
+        f"तुम्हाला आता {INTERVAL_LABEL_MR} Live LTP मिळेल! 📈\n\n"
+        "✅ Powered by Dhan API v2 ({provider})\n"
+        "🚂 Deployed on Railway.app\n\n"
+        "_Market Hours: 9:15 AM - 3:30 PM (Mon-Fri)_"
+    )
+    _LTP_FOOTER = f"_Updated {INTERVAL_LABEL_EN}_ ⏱️"
+    
+    def __init__(self, provider=DHAN_PROVIDER):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown DHAN_PROVIDER '{provider}' (expected one of {PROVIDERS})")
+        if UPDATE_INTERVAL <= 0:
+            raise ValueError(f"UPDATE_INTERVAL must be a positive integer (got {UPDATE_INTERVAL_ENV!r})")
+        self.provider = provider
+        self._startup_msg = self._STARTUP_MSG_TEMPLATE.format(provider=PROVIDER_LABELS[provider])
+        # Telegram Bot पहिल्या send ला तयार होतो
+        self._token = TELEGRAM_BOT_TOKEN
+        self._bot_obj = None
         self.running = True
         self.headers = {
             'access-token': DHAN_ACCESS_TOKEN,
@@ -42,165 +287,425 @@ class NiftyLTPBot:
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
-        logger.info("Bot initialized successfully")
+        # Dhan REST साठी HTTP/2 client (run() मध्ये तयार होतो)
+        self.http = None
+        # Telegram sends background task म्हणून - order राखण्यासाठी एका वेळी एकच
+        self._send_lock = asyncio.Semaphore(1)
+        self._send_task = None
+        # WebSocket feed मधून आलेले latest quotes: (segment, security_id) -> fields
+        self.last_quote = {}
+        self._feed_updated = None
+        self._feed_task = None
+        # Timestamp चा "%d-%m-%Y %H:%M" भाग minute भर cache
+        self._ts_minute = None
+        self._ts_prefix = None
+        # शेवटच्या schedule केलेल्या message ची key + loop time (duplicate skip साठी)
+        self._last_sent_key = None
+        self._last_sent_at = 0.0
+        logger.info(f"Bot initialized successfully (provider: {self.provider})")
     
-    def get_nifty_ltp(self):
-        """Dhan REST API वरून Nifty 50 चा LTP घेतो"""
+    async def get_nifty_ltp(self):
+        """Dhan REST API वरून watchlist मधल्या सगळ्या symbols चा LTP घेतो"""
         try:
-            # Request body for Nifty 50 Index
-            payload = {
-                "IDX_I": [NIFTY_50_SECURITY_ID]
-            }
-            
-            # Get OHLC data (includes LTP)
-            response = requests.post(
-                DHAN_OHLC_URL,
-                json=payload,
-                headers=self.headers,
-                timeout=10
-            )
-            
-            logger.info(f"API Status Code: {response.status_code}")
-            logger.info(f"API Response: {response.text}")
-            
-            if response.status_code == 200:
-                data = response.json()
+            # सगळ्या symbols साठी एकच request
+            payload = orjson.dumps({seg: list(ids) for seg, ids in WATCHLIST.items()})
+            
+            async def post_ohlc():
+                # Get OHLC data (includes LTP)
+                response = await self.http.post(DHAN_OHLC_PATH, content=payload)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+                return response.status_code, response.content
+            
+            status, body = await with_retry(post_ohlc)
+            
+            logger.info(f"API Status Code: {status}")
+            logger.info(f"API Response: {body.decode(errors='replace')}")
+            
+            if status == 200:
+                # मोठ्या watchlist साठी parse worker thread मध्ये - event loop block नको
+                if WATCHLIST_SIZE >= OFFLOAD_MIN_SYMBOLS:
+                    quotes = await asyncio.to_thread(parse_ohlc_response, body)
+                else:
+                    quotes = parse_ohlc_response(body)
                 
-                if data.get('status') == 'success' and 'data' in data:
-                    idx_data = data['data'].get('IDX_I', {})
-                    nifty_data = idx_data.get(str(NIFTY_50_SECURITY_ID), {})
-                    
-                    if nifty_data and 'last_price' in nifty_data:
-                        ltp = nifty_data['last_price']
-                        ohlc = nifty_data.get('ohlc', {})
-                        
-                        result = {
-                            'ltp': ltp,
-                            'open': ohlc.get('open', 0),
-                            'high': ohlc.get('high', 0),
-                            'low': ohlc.get('low', 0),
-                            'close': ohlc.get('close', 0)
-                        }
-                        
-                        # Calculate change
-                        if result['close'] > 0:
-                            result['change'] = ltp - result['close']
-                            result['change_pct'] = (result['change'] / result['close']) * 100
-                        else:
-                            result['change'] = 0
-                            result['change_pct'] = 0
-                        
-                        logger.info(f"LTP fetched successfully: {ltp}")
-                        return result
+                if quotes:
+                    logger.info(f"LTP fetched successfully for {len(quotes)} symbols")
+                    return quotes
             
-            logger.warning(f"API returned non-success response: {response.status_code}")
+            logger.warning(f"API returned non-success response: {status}")
             return None
             
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.error("API request timeout")
             return None
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"API request error: {e}")
             return None
         except Exception as e:
             logger.error(f"Error getting LTP: {e}")
             return None
     
-    async def send_ltp_message(self, data):
-        """Telegram वर LTP पाठवतो"""
-        try:
-            timestamp = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+    async def _feed_loop(self):
+        """Dhan WebSocket feed शी connect राहतो - disconnect झाल्यास backoff ने reconnect"""
+        params = {
+            'version': '2',
+            'token': DHAN_ACCESS_TOKEN,
+            'clientId': DHAN_CLIENT_ID,
+            'authType': '2'
+        }
+        instruments = [
+            {'ExchangeSegment': seg, 'SecurityId': str(sid)}
+            for seg, ids in WATCHLIST.items()
+            for sid in ids
+        ]
+        backoff = 1
+        
+        # Feed साठी वेगळा session - long-lived socket ला total timeout नको
+        async with aiohttp.ClientSession() as session:
+            while self.running:
+                wait = seconds_until_next_open(datetime.now(IST))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                
+                try:
+                    async with session.ws_connect(DHAN_FEED_URL, params=params, heartbeat=30) as ws:
+                        for i in range(0, len(instruments), FEED_SUBSCRIBE_BATCH):
+                            batch = instruments[i:i + FEED_SUBSCRIBE_BATCH]
+                            await ws.send_json({
+                                'RequestCode': FEED_REQUEST_QUOTE,
+                                'InstrumentCount': len(batch),
+                                'InstrumentList': batch
+                            })
+                        logger.info(f"Feed connected - subscribed {len(instruments)} instruments")
+                        backoff = 1
+                        
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.BINARY:
+                                self._handle_feed_packet(msg.data)
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                break
+                    
+                    logger.warning("Feed disconnected")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Feed error: {e}")
+                
+                logger.info(f"Feed reconnecting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, FEED_RECONNECT_MAX)
+    
+    def _handle_feed_packet(self, packet):
+        """Feed binary packet parse करून last_quote update करतो - खराब packet skip होतो"""
+        offset = 0
+        while offset + FEED_HEADER.size <= len(packet):
+            code, length, seg_code, sid = FEED_HEADER.unpack_from(packet, offset)
+            if length < FEED_HEADER.size or offset + length > len(packet):
+                # Length चुकीचा - पुढचा packet कुठे सुरू होतो ते कळत नाही, उरलेला frame सोडा
+                logger.warning(f"Malformed feed packet (code {code}, length {length}) - skipping")
+                break
+            
+            body = offset + FEED_HEADER.size
+            layout = FEED_BODIES.get(code)
+            if layout is not None and FEED_HEADER.size + layout.size > length:
+                logger.warning(f"Short feed packet (code {code}, length {length}) - skipping")
+                offset += length
+                continue
+            
+            key = (FEED_SEGMENT_NAMES.get(seg_code), sid)
+            
+            if code == FEED_TICKER:
+                ltp, _ = FEED_TICKER_BODY.unpack_from(packet, body)
+                self.last_quote.setdefault(key, {})['ltp'] = ltp
+            elif code == FEED_QUOTE:
+                ltp, _, _, _, _, _, _, open_, _, high, low = FEED_QUOTE_BODY.unpack_from(packet, body)
+                self.last_quote.setdefault(key, {}).update(
+                    ltp=ltp, open=open_, high=high, low=low
+                )
+            elif code == FEED_PREV_CLOSE:
+                close, _ = FEED_PREV_CLOSE_BODY.unpack_from(packet, body)
+                self.last_quote.setdefault(key, {})['close'] = close
+            elif code == FEED_DISCONNECT:
+                reason, = FEED_DISCONNECT_BODY.unpack_from(packet, body)
+                logger.warning(f"Feed disconnect packet received: {reason}")
+            
+            if code in (FEED_TICKER, FEED_QUOTE):
+                self._feed_updated = asyncio.get_running_loop().time()
             
+            offset += length
+    
+    def get_feed_quotes(self):
+        """Feed मधून आलेले quotes देतो - feed stale असेल तर None"""
+        if self._feed_updated is None:
+            return None
+        if asyncio.get_running_loop().time() - self._feed_updated > 2 * UPDATE_INTERVAL:
+            return None
+        
+        quotes = []
+        for seg, names in WATCHLIST.items():
+            for sid, name in names.items():
+                fields = self.last_quote.get((seg, sid))
+                if not fields or 'ltp' not in fields:
+                    continue
+                quotes.append(build_quote(
+                    name,
+                    fields['ltp'],
+                    fields.get('open', 0),
+                    fields.get('high', 0),
+                    fields.get('low', 0),
+                    fields.get('close', 0)
+                ))
+        return quotes or None
+    
+    async def get_quotes(self):
+        """Configured provider कडून quotes घेतो"""
+        if self.provider == "feed":
+            quotes = self.get_feed_quotes()
+            if quotes:
+                return quotes
+        return await self.get_nifty_ltp()
+    
+    def _timestamp(self):
+        """IST मध्ये message timestamp - strftime फक्त minute बदलल्यावर"""
+        now = datetime.now(IST)
+        minute = now.replace(second=0, microsecond=0)
+        if minute != self._ts_minute:
+            self._ts_minute = minute
+            self._ts_prefix = now.strftime("%d-%m-%Y %H:%M")
+        return f"{self._ts_prefix}:{now.second:02d}"
+    
+    @staticmethod
+    def _quotes_key(quotes):
+        """Duplicate तपासण्यासाठी quotes ची compact key"""
+        return tuple((q.name, round(q.ltp, 2), q.high, q.low) for q in quotes)
+    
+    def _should_send(self, quotes):
+        """Quotes मागच्या message सारखेच असतील तर skip - heartbeat interval नंतर मात्र पाठवा
+        
+        True दिल्यावर key लगेच record होते (send background मध्ये in-flight असतानाच),
+        म्हणजे पुढच्या tick ला तोच message परत queue होत नाही.
+        """
+        key = self._quotes_key(quotes)
+        now = asyncio.get_running_loop().time()
+        if (key == self._last_sent_key
+                and now - self._last_sent_at < HEARTBEAT_MINUTES * 60):
+            return False
+        self._last_sent_key = key
+        self._last_sent_at = now
+        return True
+    
+    async def send_ltp_message(self, quotes):
+        """Telegram वर सगळ्या symbols चा LTP एकाच message मध्ये पाठवतो"""
+        async with self._send_lock:
+            await self._send_ltp_message(quotes)
+    
+    def _build_messages(self, quotes, timestamp):
+        """Quotes वरून Telegram messages बनवतो - प्रत्येक message Telegram limit मध्ये"""
+        tail = f"🕐 Time: {timestamp}\n{self._LTP_FOOTER}"
+        messages = []
+        blocks = []
+        size = telegram_length(tail)
+        
+        for data in quotes:
             # Change indicator
-            change_emoji = "🟢" if data['change'] >= 0 else "🔴"
-            change_sign = "+" if data['change'] >= 0 else ""
+            change_emoji = "🟢" if data.change >= 0 else "🔴"
+            change_sign = "+" if data.change >= 0 else ""
             
-            message = f"📊 *NIFTY 50 LIVE*\n\n"
-            message += f"💰 LTP: ₹{data['ltp']:,.2f}\n"
+            parts = [f"📊 *{data.name} LIVE*", "", f"💰 LTP: ₹{data.ltp:,.2f}"]
             
-            if data['change'] != 0:
-                message += f"{change_emoji} Change: {change_sign}{data['change']:,.2f} ({change_sign}{data['change_pct']:.2f}%)\n\n"
+            if data.change != 0:
+                parts.append(f"{change_emoji} Change: {change_sign}{data.change:,.2f} ({change_sign}{data.change_pct:.2f}%)")
+                parts.append("")
             
-            if data['open'] > 0:
-                message += f"🔵 Open: ₹{data['open']:,.2f}\n"
-            if data['high'] > 0:
-                message += f"📈 High: ₹{data['high']:,.2f}\n"
-            if data['low'] > 0:
-                message += f"📉 Low: ₹{data['low']:,.2f}\n"
-            if data['close'] > 0:
-                message += f"⚪ Prev Close: ₹{data['close']:,.2f}\n"
+            if data.open > 0:
+                parts.append(f"🔵 Open: ₹{data.open:,.2f}")
+            if data.high > 0:
+                parts.append(f"📈 High: ₹{data.high:,.2f}")
+            if data.low > 0:
+                parts.append(f"📉 Low: ₹{data.low:,.2f}")
+            if data.close > 0:
+                parts.append(f"⚪ Prev Close: ₹{data.close:,.2f}")
             
-            message += f"\n🕐 Time: {timestamp}\n"
-            message += f"_Updated every minute_ ⏱️"
+            parts.append("")
+            block = "\n".join(parts)
             
-            await self.bot.send_message(
-                chat_id=TELEGRAM_CHAT_ID,
-                text=message,
-                parse_mode='Markdown'
-            )
-            logger.info(f"Message sent - LTP: {data['ltp']}")
+            block_size = telegram_length(block) + 1
+            if blocks and size + block_size > TELEGRAM_MAX_LENGTH:
+                messages.append("\n".join(blocks + [tail]))
+                blocks = []
+                size = telegram_length(tail)
+            blocks.append(block)
+            size += block_size
+        
+        messages.append("\n".join(blocks + [tail]))
+        return messages
+    
+    async def _send_ltp_message(self, quotes):
+        """Messages तयार करून Telegram वर पाठवतो"""
+        try:
+            timestamp = self._timestamp()
+            
+            # मोठ्या watchlist साठी formatting worker thread मध्ये
+            if len(quotes) >= OFFLOAD_MIN_SYMBOLS:
+                messages = await asyncio.to_thread(self._build_messages, quotes, timestamp)
+            else:
+                messages = self._build_messages(quotes, timestamp)
+            
+            # Chunks एकामागून एक - chat मधला order आणि per-chat rate limit राखण्यासाठी
+            bot = await self._get_bot()
+            for message in messages:
+                await with_retry(lambda: bot.send_message(
+                    chat_id=TELEGRAM_CHAT_ID,
+                    text=message,
+                    parse_mode='Markdown'
+                ), idempotent=False)
+            logger.info(f"Message sent - {len(quotes)} symbols")
             
         except Exception as e:
             logger.error(f"Error sending message: {e}")
+            # Fail झाला - key clear करा म्हणजे पुढच्या tick ला परत पाठवला जाईल
+            if self._last_sent_key == self._quotes_key(quotes):
+                self._last_sent_key = None
     
     async def run(self):
-        """Main loop - दर मिनिटाला LTP पाठवतो"""
-        logger.info("🚀 Bot started! Sending Nifty 50 LTP every minute...")
+        """Main loop - दर interval ला LTP पाठवतो"""
+        logger.info(f"🚀 Bot started! Sending LTP {INTERVAL_LABEL_EN}...")
         
-        await self.send_startup_message()
+        # एकच keep-alive HTTP/2 connection - handshake एकदाच, headers HPACK ने compress
+        self.http = httpx.AsyncClient(
+            base_url=DHAN_API_BASE,
+            headers=self.headers,
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=120)
+        )
+        
+        if self.provider == "feed":
+            self._feed_task = asyncio.create_task(self._feed_loop())
+        
+        await self._run_loop()
+    
+    async def _get_bot(self):
+        """Telegram Bot lazily तयार करून initialize करतो (get_me - network call)"""
+        if self._bot_obj is None:
+            self._bot_obj = Bot(token=self._token)
+        # आधीच initialized असेल तर no-op; fail झाल्यास पुढच्या send ला परत प्रयत्न
+        await self._bot_obj.initialize()
+        return self._bot_obj
+    
+    async def aclose(self):
+        """Feed थांबवतो, pending send पूर्ण करून HTTP sessions बंद करतो"""
+        if self._feed_task is not None:
+            self._feed_task.cancel()
+            await asyncio.gather(self._feed_task, return_exceptions=True)
+        if self._send_task is not None:
+            await asyncio.gather(self._send_task, return_exceptions=True)
+        if self._bot_obj is not None:
+            await self._bot_obj.shutdown()
+        if self.http is not None and not self.http.is_closed:
+            await self.http.aclose()
+            logger.info("HTTP client closed")
+    
+    async def _run_loop(self):
+        """दर interval ला LTP fetch करून पाठवतो"""
+        # Telegram बंद असला तरी Dhan polling सुरू व्हायला हवे
+        try:
+            await asyncio.wait_for(self.send_startup_message(), timeout=STARTUP_MSG_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Startup message timed out - continuing without it")
+        
+        loop = asyncio.get_running_loop()
+        next_tick = None
         
         while self.running:
             try:
-                data = self.get_nifty_ltp()
+                wait = seconds_until_next_open(datetime.now(IST))
+                if wait > 0:
+                    # Market बंद - उगाच दर मिनिटाला poll करू नका
+                    logger.info(f"Market closed - sleeping {wait:.0f}s until next open")
+                    await asyncio.sleep(wait)
+                    next_tick = None
+                    continue
+                
+                if next_tick is None:
+                    # पहिला tick चालू minute boundary वर snap करा
+                    now = datetime.now(IST)
+                    next_tick = loop.time() - (now.second + now.microsecond / 1e6) % UPDATE_INTERVAL
+                
+                data = await self.get_quotes()
                 
-                if data:
-                    await self.send_ltp_message(data)
+                if data and not self._should_send(data):
+                    logger.info("Quotes unchanged - skipping message")
+                elif data:
+                    # Send background मध्ये - Telegram ack ची वाट न पाहता पुढचा fetch
+                    self._send_task = asyncio.create_task(self.send_ltp_message(data))
                 else:
                     logger.warning("Could not fetch LTP - Market might be closed or API issue")
                 
-                # 1 minute wait
-                await asyncio.sleep(60)
-                
             except KeyboardInterrupt:
                 logger.info("Bot stopped by user")
                 self.running = False
                 break
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
-                await asyncio.sleep(60)
+            
+            # Absolute deadline - work चा वेळ interval मध्ये जोडला जात नाही, drift नाही
+            if next_tick is None:
+                next_tick = loop.time()
+            next_tick += UPDATE_INTERVAL
+            while next_tick < loop.time():
+                # मागे पडलो तर missed ticks skip करा (alignment तसाच राहतो)
+                next_tick += UPDATE_INTERVAL
+            await asyncio.sleep(max(0, next_tick - loop.time()))
     
     async def send_startup_message(self):
         """Bot सुरू झाल्यावर message पाठवतो"""
         try:
-            msg = "🤖 *Nifty 50 LTP Bot Started!*\n\n"
-            msg += "तुम्हाला आता दर मिनिटाला Nifty 50 चा Live LTP मिळेल! 📈\n\n"
-            msg += "✅ Powered by Dhan API v2 (REST)\n"
-            msg += "🚂 Deployed on Railway.app\n\n"
-            msg += "_Market Hours: 9:15 AM - 3:30 PM (Mon-Fri)_"
-            
-            await self.bot.send_message(
+            # पहिले initialize (get_me) इथे - STARTUP_MSG_TIMEOUT च्या आत
+            bot = await self._get_bot()
+            await with_retry(lambda: bot.send_message(
                 chat_id=TELEGRAM_CHAT_ID,
-                text=msg,
+                text=self._startup_msg,
                 parse_mode='Markdown'
-            )
+            ), idempotent=False)
             logger.info("Startup message sent")
         except Exception as e:
             logger.error(f"Error sending startup message: {e}")
 
 
+async def main():
+    bot = NiftyLTPBot()
+    try:
+        await bot.run()
+    finally:
+        await bot.aclose()
+
+
 # ========================
 # BOT RUN करा
 # ========================
 if __name__ == "__main__":
     try:
         # Environment variables check
-        if not all([TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN]):
-            logger.error("❌ Missing environment variables!")
-            logger.error("Please set: TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, DHAN_CLIENT_ID, DHAN_ACCESS_TOKEN")
-            exit(1)
+        missing = [k for k in REQUIRED_ENV if not os.environ.get(k)]
+        if missing:
+            logger.error(f"❌ Missing environment variables: {', '.join(missing)}")
+            sys.exit(1)
+        
+        if UPDATE_INTERVAL <= 0:
+            logger.error(f"❌ UPDATE_INTERVAL must be a positive integer (got {UPDATE_INTERVAL_ENV!r})")
+            sys.exit(1)
+        
+        # uvloop उपलब्ध असेल तर (Linux/Railway) वेगवान event loop
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            pass
         
-        bot = NiftyLTPBot()
-        asyncio.run(bot.run())
+        asyncio.run(main())
     except Exception as e:
         logger.error(f"Fatal error: {e}")
-        exit(1)
+        sys.exit(1)